@@ -13,16 +13,21 @@
 const cron = require('node-cron');
 const fs = require('fs').promises;
 const path = require('path');
-const { exec } = require('child_process');
-const { promisify } = require('util');
-const execAsync = promisify(exec);
 
 // Import our pipeline
 const AIContentPipeline = require('./content-generation-pipeline.js');
+const KDPConverterWorker = require('./kdp-converter-worker.cjs');
 
 class AutomationScheduler {
   constructor() {
     this.pipeline = new AIContentPipeline();
+    
+    // 常駐変換ワーカー（初回変換時に起動し、以降は同じプロセスを再利用）
+    this.converterWorker = new KDPConverterWorker({
+      script: path.join(__dirname, 'markdown-to-kdp-converter.py'),
+      args: ['--output', path.join(__dirname, 'kdp-output')]
+    });
+    this.converterWorker.on('warning', message => this.log(message, 'WARN'));
     this.config = {
       schedule: {
         daily_generation: '0 6 * * *',      // 毎日06:00
@@ -158,6 +163,7 @@ class AutomationScheduler {
           
           await this.log(`✅ 書籍生成成功: ${result.structure.title} (品質: ${result.quality}/10)`);
           await this.notifySuccess('生成', result);
+          await this.convertGeneratedBook(result);
           
         } else {
           throw new Error(`品質基準未達成: ${result.quality}/10`);
@@ -182,6 +188,27 @@ class AutomationScheduler {
     return success;
   }
   
+  // 生成直後の章Markdownをファイルを読み直さずに常駐ワーカーへ送信
+  // 変換失敗は生成結果に影響させず、runKDPUploadでディスク上から再変換する
+  async convertGeneratedBook(result) {
+    const book = path.basename(result.bookPath);
+    
+    try {
+      await this.log(`📂 KDP変換実行: ${book}`);
+      const conversion = await this.converterWorker.convertBook(book, result.sources.chapters, {
+        index: result.sources.index
+      });
+      
+      if (!conversion.success) {
+        throw new Error(conversion.error);
+      }
+      
+      await this.log(`✅ KDP変換完了: ${conversion.output_dir}`);
+    } catch (error) {
+      await this.log(`⚠️ KDP変換エラー: ${book}: ${error.message}`, 'WARN');
+    }
+  }
+  
   async runQualityCheck() {
     await this.log('🔍 品質チェック開始');
     
@@ -226,20 +253,26 @@ class AutomationScheduler {
     await this.log('📤 KDPアップロード開始');
     
     try {
-      // 品質チェック済みの書籍を取得
+      // 生成時に変換できなかった書籍・手動で追加された書籍はディスク上から変換
+      const today = new Date().toISOString().split('T')[0];
+      const booksDir = path.join(__dirname, 'docs', 'generated-books');
       const outputDir = path.join(__dirname, 'kdp-output');
       
-      if (!(await this.fileExists(outputDir))) {
-        await this.log('📂 KDP出力ディレクトリが存在しません - 変換実行');
+      const books = (await fs.readdir(booksDir)).filter(book => book.includes(today));
+      
+      for (const book of books) {
+        if (await this.fileExists(path.join(outputDir, book, 'kdp-metadata.json'))) {
+          continue;
+        }
         
-        // Markdown → KDP変換実行
-        const { stdout, stderr } = await execAsync('python3 markdown-to-kdp-converter.py docs/generated-books/latest');
+        await this.log(`📂 KDP変換実行: ${book}`);
+        const result = await this.converterWorker.send({ book_path: path.join(booksDir, book) });
         
-        if (stderr) {
-          throw new Error(`変換エラー: ${stderr}`);
+        if (!result.success) {
+          throw new Error(`変換エラー: ${result.error}`);
         }
         
-        await this.log('✅ KDP変換完了');
+        await this.log(`✅ KDP変換完了: ${result.output_dir}`);
       }
       
       // KDPアップロード（実装必要 - 現在はモック）
@@ -396,6 +429,7 @@ class AutomationScheduler {
   
   async shutdown() {
     await this.log('🛑 自動化システム停止');
+    await this.converterWorker.stop().catch(() => {});
     await this.saveStats();
     process.exit(0);
   }
@@ -135,7 +135,8 @@ ${bookStructure.chapters.map((chapter, index) =>
     
     await fs.writeFile(path.join(bookDir, 'index.md'), indexContent)
     
-    // 各章のファイル生成
+    // 各章のファイル生成（KDP変換用にメモリ上にも保持）
+    const chapters = []
     for (const chapter of bookStructure.chapters) {
       const chapterContent = await this.generateChapterContent(chapter, bookStructure)
       const chapterMarkdown = `---
@@ -158,9 +159,10 @@ ${chapterContent}
         path.join(bookDir, `${chapter.slug}.md`), 
         chapterMarkdown
       )
+      chapters.push({ filename: `${chapter.slug}.md`, markdown: chapterMarkdown })
     }
     
-    return bookDir
+    return { bookDir, index: indexContent, chapters }
   }
 
   // 品質チェック
@@ -208,11 +210,10 @@ ${chapterContent}
       )
       
       console.log('✍️ コンテンツ生成中...')
-      const bookPath = await this.generateVitePressContent(bookStructure)
+      const { bookDir: bookPath, index, chapters } = await this.generateVitePressContent(bookStructure)
       
       console.log('🔍 品質チェック実行中...')
-      const indexContent = await fs.readFile(path.join(bookPath, 'index.md'), 'utf8')
-      const quality = await this.qualityCheck(indexContent)
+      const quality = await this.qualityCheck(index)
       
       if (!quality.passed) {
         console.log('❌ 品質基準未達成:', quality.feedback)
@@ -224,6 +225,7 @@ ${chapterContent}
         success: true, 
         bookPath, 
         structure: bookStructure,
+        sources: { index, chapters },
         quality: quality.score 
       }
       
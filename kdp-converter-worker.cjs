@@ -0,0 +1,137 @@
+// kdp-converter-worker.cjs
+// 常駐Python変換ワーカー（markdown-to-kdp-converter.py --worker）のクライアント
+// プロセス起動・importのコストを1回だけ払い、書籍をJSON Linesで送信する
+const { spawn } = require('child_process')
+const { EventEmitter } = require('events')
+const { createInterface } = require('readline')
+
+class KDPConverterWorker extends EventEmitter {
+  constructor(options = {}) {
+    super()
+    this.python = options.python || 'python3'
+    this.script = options.script || 'markdown-to-kdp-converter.py'
+    this.args = options.args || []
+    this.timeoutMs = options.timeoutMs || 10 * 60 * 1000
+    this.pending = new Map()
+    this.nextId = 1
+    this.process = null
+  }
+
+  start() {
+    if (this.process) return
+
+    const child = spawn(this.python, [this.script, '--worker', ...this.args], {
+      stdio: ['pipe', 'pipe', 'inherit']
+    })
+    this.process = child
+
+    createInterface({ input: child.stdout }).on('line', line => this._onLine(line))
+
+    // python3が見つからない等の起動失敗・パイプ切断で未処理例外にしない
+    child.on('error', error => this._onExit(child, error))
+    child.stdin.on('error', error => this._onExit(child, error))
+    child.on('exit', code => {
+      this._onExit(child, new Error(`変換ワーカーが終了しました (code: ${code})`))
+    })
+  }
+
+  _onExit(child, error) {
+    if (this.process !== child) return
+
+    this.process = null
+    for (const id of [...this.pending.keys()]) {
+      this._settle(id, null, error)
+    }
+  }
+
+  _onLine(line) {
+    let response
+    try {
+      response = JSON.parse(line)
+    } catch {
+      this.emit('warning', `変換ワーカーの不正な応答: ${line}`)
+      return
+    }
+
+    // id: null はリクエスト行を解析できなかった応答（ワーカーは逐次処理のため最古の要求に対応）
+    const id = response.id === null ? this.pending.keys().next().value : response.id
+    if (id === undefined || !this.pending.has(id)) return
+
+    if (response.id === null) {
+      this._settle(id, null, new Error(response.error || '不正なリクエスト'))
+    } else {
+      this._settle(id, response)
+    }
+  }
+
+  _settle(id, response, error) {
+    const request = this.pending.get(id)
+    if (!request) return
+
+    this.pending.delete(id)
+    clearTimeout(request.timer)
+    if (error) {
+      request.reject(error)
+    } else {
+      request.resolve(response)
+    }
+  }
+
+  /**
+   * 変換リクエスト送信
+   * @param {Object} request - { book, index?, metadata?, chapters: [{ filename, markdown }] }
+   *   または { book_path }
+   * @returns {Promise<Object>} - ワーカーの結果レコード
+   */
+  send(request) {
+    this.start()
+
+    const id = request.id || `req-${this.nextId++}`
+    const child = this.process
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        // 応答しないワーカーは停止させ、残りの要求も失敗させる（次のsendで再起動）
+        this._settle(id, null, new Error(`変換ワーカーの応答がタイムアウトしました (${id})`))
+        this._onExit(child, new Error(`変換ワーカーを停止しました (タイムアウト: ${id})`))
+        child.kill()
+      }, this.timeoutMs)
+
+      this.pending.set(id, { resolve, reject, timer })
+      child.stdin.write(`${JSON.stringify({ ...request, id })}\n`)
+    })
+  }
+
+  /**
+   * メモリ上の章Markdownを変換（ファイルを書き出さずに送信）
+   * @param {string} book - 書籍名（出力ディレクトリ名）
+   * @param {Array<{filename: string, markdown: string}>} chapters
+   * @param {Object} options - { index?: index.mdの内容, metadata?: 追加メタデータ }
+   */
+  convertBook(book, chapters, options = {}) {
+    return this.send({
+      book,
+      index: options.index,
+      metadata: options.metadata || {},
+      chapters
+    })
+  }
+
+  async stop() {
+    if (!this.process) return
+
+    const child = this.process
+    // 起動失敗時はexitが発火しないためerrorでも待機を終える
+    const exited = new Promise(resolve => {
+      child.once('exit', resolve)
+      child.once('error', resolve)
+    })
+    try {
+      await this.send({ command: 'shutdown' })
+    } finally {
+      child.stdin.end()
+      await exited
+    }
+  }
+}
+
+module.exports = KDPConverterWorker
@@ -7,20 +7,26 @@ VitePressで生成されたMarkdownコンテンツを
 KDP対応フォーマット（EPUB, PDF, MOBI）に変換
 
 Required packages:
-pip install ebooklib markdown beautifulsoup4 Pillow pypdf2 requests
+pip install ebooklib markdown beautifulsoup4 Pillow pypdf2 requests numpy
 """
 
 import os
 import json
 import re
+import random
+import hashlib
 import logging
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Optional
 import zipfile
 import tempfile
+import shutil
+import sys
+import time
 
 # Core libraries
+import numpy as np
 import markdown
 from bs4 import BeautifulSoup
 from ebooklib import epub
@@ -31,6 +37,310 @@ import requests
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class SimilarityIndex:
+    """ライブラリ横断の類似コンテンツ索引（シングリング + MinHash/LSH）
+
+    章・書籍ごとのMinHash署名をJSONで永続化し、LSHバケットで
+    候補のみを比較するため、全ペア比較をせずに重複を検出できる。
+    """
+
+    # 32bitハッシュ × 31bit係数でuint64内に収まるため、numpyで一括計算できる
+    MERSENNE_PRIME = (1 << 31) - 1
+    SIGNATURE_CHUNK = 4096
+
+    def __init__(self, index_path: str, num_perm: int = 128, bands: int = 16,
+                 shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.index_path = index_path
+        self.params = {
+            'num_perm': num_perm,
+            'bands': bands,
+            'shingle_size': shingle_size,
+            'seed': seed,
+            'hash': 'minhash32'
+        }
+        self.rows = num_perm // bands
+
+        rng = random.Random(seed)
+        perms = [
+            (rng.randrange(1, self.MERSENNE_PRIME), rng.randrange(0, self.MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+        self._perm_a = np.array([a for a, _ in perms], dtype=np.uint64)
+        self._perm_b = np.array([b for _, b in perms], dtype=np.uint64)
+
+        self.entries = {}
+        self.buckets = {}
+        self.book_keys = {}
+        self.dirty = False
+        self.load()
+
+    def load(self, path: str = None, books: Optional[set] = None):
+        """永続化済み索引の読み込み
+
+        pathを指定すると他の索引（シャードの索引など）を取り込み、同じキーは
+        上書きする。booksを指定した場合はその書籍のエントリのみ取り込む。
+        """
+        path = path or self.index_path
+        if not path or not os.path.exists(path):
+            return
+
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        if data.get('params') != self.params:
+            logger.warning(f"類似索引のパラメータが異なるため読み込みません: {path}")
+            return
+
+        for key, entry in data.get('entries', {}).items():
+            if books is not None and entry['book'] not in books:
+                continue
+            if key in self.entries:
+                self.remove(key)
+            self._insert(key, entry)
+
+    def save(self):
+        """索引の保存（バケットは署名から再構築するため保存しない）
+
+        全エントリを書き出すため、書籍ごとではなく実行終了時に1回だけ呼ぶ。
+        """
+        if not self.index_path or not self.dirty:
+            return
+
+        index_dir = os.path.dirname(self.index_path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'params': self.params, 'entries': self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+        self.dirty = False
+
+    def shingles(self, text: str) -> set:
+        """文字単位シングル生成（空白・Markdown記号は除去）"""
+        normalized = re.sub(r'[\s#*_>`|\-]+', '', text).lower()
+        k = self.params['shingle_size']
+        if len(normalized) < k:
+            return {normalized} if normalized else set()
+        return {normalized[i:i + k] for i in range(len(normalized) - k + 1)}
+
+    def signature(self, text: str) -> Optional[List[int]]:
+        """MinHash署名計算（numpyで全ハッシュ関数を一括評価）"""
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'big')
+             for shingle in self.shingles(text)),
+            dtype=np.uint64
+        )
+        if hashes.size == 0:
+            return None
+
+        prime = np.uint64(self.MERSENNE_PRIME)
+        signature = np.full(self.params['num_perm'], np.iinfo(np.uint64).max, dtype=np.uint64)
+        # シングル数 × num_perm の行列が大きくなりすぎないよう分割して計算
+        for start in range(0, hashes.size, self.SIGNATURE_CHUNK):
+            chunk = hashes[start:start + self.SIGNATURE_CHUNK, None]
+            values = (chunk * self._perm_a + self._perm_b) % prime
+            np.minimum(signature, values.min(axis=0), out=signature)
+        return signature.tolist()
+
+    @staticmethod
+    def merge_signatures(signatures: List[List[int]]) -> Optional[List[int]]:
+        """和集合のMinHash署名（要素ごとの最小値）"""
+        if not signatures:
+            return None
+        return [min(values) for values in zip(*signatures)]
+
+    def _band_keys(self, kind: str, signature: List[int]) -> List[str]:
+        keys = []
+        for band in range(self.params['bands']):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(repr(rows).encode('ascii'), digest_size=8).hexdigest()
+            keys.append(f"{kind}:{band}:{digest}")
+        return keys
+
+    def _insert(self, key: str, entry: Dict):
+        self.entries[key] = entry
+        self.book_keys.setdefault(entry['book'], set()).add(key)
+        for band_key in self._band_keys(entry['kind'], entry['signature']):
+            self.buckets.setdefault(band_key, set()).add(key)
+
+    def add(self, key: str, kind: str, book: str, label: str, signature: List[int]):
+        """署名を索引に追加"""
+        self.remove(key)
+        self._insert(key, {'kind': kind, 'book': book, 'label': label, 'signature': signature})
+        self.dirty = True
+
+    def remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if not entry:
+            return
+        self.dirty = True
+
+        keys = self.book_keys.get(entry['book'])
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del self.book_keys[entry['book']]
+
+        for band_key in self._band_keys(entry['kind'], entry['signature']):
+            bucket = self.buckets.get(band_key)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band_key]
+
+    def remove_book(self, book: str):
+        """書籍の既存エントリ削除（再変換時）"""
+        for key in list(self.book_keys.get(book, ())):
+            self.remove(key)
+
+    def query(self, kind: str, signature: List[int], threshold: float,
+              exclude: Optional[set] = None) -> List[Dict]:
+        """LSH候補から推定Jaccard類似度が閾値以上のものを返す（excludeのキーは除外）"""
+        candidates = set()
+        for band_key in self._band_keys(kind, signature):
+            candidates |= self.buckets.get(band_key, set())
+        if exclude:
+            candidates -= exclude
+
+        matches = []
+        for key in candidates:
+            entry = self.entries[key]
+            same = sum(1 for x, y in zip(signature, entry['signature']) if x == y)
+            score = same / len(signature)
+            if score >= threshold:
+                matches.append({
+                    'book': entry['book'],
+                    'label': entry['label'],
+                    'similarity': round(score, 3)
+                })
+
+        return sorted(matches, key=lambda m: (-m['similarity'], m['book'], m['label']))
+
+    def check_book(self, book: str, chapters: List[Dict], threshold: float) -> Dict:
+        """書籍の章・書籍全体を索引と照合し、登録する"""
+        self.remove_book(book)
+
+        report = {'chapters': [], 'book': []}
+        chapter_signatures = []
+
+        for chapter in chapters:
+            signature = self.signature(chapter.get('markdown', ''))
+            if signature is None:
+                continue
+            chapter_signatures.append(signature)
+
+            matches = self.query('chapter', signature, threshold)
+            if matches:
+                report['chapters'].append({'chapter': chapter['filename'], 'matches': matches})
+            self.add(f"chapter:{book}/{chapter['filename']}", 'chapter', book, chapter['filename'], signature)
+
+        book_signature = self.merge_signatures(chapter_signatures)
+        if book_signature is not None:
+            report['book'] = self.query('book', book_signature, threshold)
+            self.add(f"book:{book}", 'book', book, book, book_signature)
+
+        return report
+
+    def recheck_book(self, book: str, threshold: float) -> Dict:
+        """登録済みの書籍を索引全体（自身のエントリを除く）と再照合する
+
+        check_bookと異なり登録順に依存しないため、シャード統合後の
+        索引に対して1回だけ実行すれば分割方法によらず同じ結果になる。
+        """
+        report = {'chapters': [], 'book': []}
+        for key in sorted(self.book_keys.get(book, ())):
+            entry = self.entries[key]
+            matches = self.query(entry['kind'], entry['signature'], threshold, exclude={key})
+            if entry['kind'] == 'book':
+                report['book'] = matches
+            elif matches:
+                report['chapters'].append({'chapter': entry['label'], 'matches': matches})
+        return report
+
+
+class ArtifactBundle:
+    """実行結果を単一アーカイブへ逐次書き込むバンドラー
+
+    書籍ごとの成果物を生成直後にZIPへ追加し、最後にダイジェスト付き
+    manifest.jsonを書き込む。圧縮済み形式は再圧縮せず格納する。
+    """
+
+    STORED_SUFFIXES = ('.epub', '.png', '.jpg', '.jpeg', '.pdf', '.zip')
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, bundle_path: str, base_dir: str):
+        bundle_dir = os.path.dirname(bundle_path)
+        if bundle_dir:
+            os.makedirs(bundle_dir, exist_ok=True)
+
+        self.bundle_path = bundle_path
+        self.base_dir = base_dir
+        self.manifest = []
+        self.closed = False
+        self._zip = zipfile.ZipFile(bundle_path, 'w', zipfile.ZIP_DEFLATED)
+
+    def add_file(self, file_path: str, book: str = None) -> Dict:
+        """ファイルをストリーミング追加（SHA-256を同時計算）"""
+        arcname = os.path.relpath(file_path, self.base_dir).replace(os.sep, '/')
+
+        info = zipfile.ZipInfo.from_file(file_path, arcname)
+        if file_path.lower().endswith(self.STORED_SUFFIXES):
+            info.compress_type = zipfile.ZIP_STORED
+        else:
+            info.compress_type = zipfile.ZIP_DEFLATED
+
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as src, self._zip.open(info, 'w') as dst:
+            for chunk in iter(lambda: src.read(self.CHUNK_SIZE), b''):
+                digest.update(chunk)
+                dst.write(chunk)
+
+        entry = {
+            'path': arcname,
+            'book': book,
+            'size': info.file_size,
+            'sha256': digest.hexdigest()
+        }
+        self.manifest.append(entry)
+        return entry
+
+    def add_package(self, result: Dict):
+        """generate_kdp_packageの成果物を追加"""
+        book = os.path.basename(result['output_dir'])
+        for file_path in list(result['files'].values()) + [result['metadata_file']]:
+            self.add_file(file_path, book)
+
+    def close(self) -> str:
+        """manifest.jsonを書き込んでアーカイブを閉じる"""
+        manifest = {
+            'generated_at': datetime.now().isoformat(),
+            'books': sorted({entry['book'] for entry in self.manifest if entry['book']}),
+            'files': self.manifest
+        }
+        self._zip.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2))
+        self._zip.close()
+        self.closed = True
+
+        logger.info(f"📦 バンドル作成完了: {self.bundle_path} ({len(self.manifest)}ファイル)")
+        return self.bundle_path
+
+    def abort(self):
+        """途中で失敗した場合にアーカイブを閉じて削除（不完全なZIPを残さない）"""
+        if self.closed:
+            return
+        try:
+            self._zip.close()
+        finally:
+            self.closed = True
+            if os.path.exists(self.bundle_path):
+                os.remove(self.bundle_path)
+            logger.warning(f"📦 バンドル作成中断: {self.bundle_path} を削除しました")
+
+
 class KDPConverter:
     """Markdown to KDP format converter"""
     
@@ -45,12 +355,17 @@ class KDPConverter:
             "epub_settings": {
                 "language": "ja",
                 "publisher": "AI Living Books",
-                "rights": "© 2025 AI Generated Content"
+                "rights": "© 2025 AI Generated Content",
+                "max_xhtml_bytes": 256 * 1024
             },
             "pdf_settings": {
                 "page_size": "A5",
                 "font_family": "Noto Sans CJK JP",
-                "margin": 20
+                "margin": 20,
+                "engine": "pandoc",
+                "font_path": None,
+                "font_size": 10.5,
+                "line_height": 1.7
             },
             "cover_settings": {
                 "width": 1600,
@@ -63,7 +378,15 @@ class KDPConverter:
                 "Business & Money",
                 "Health, Fitness & Dieting",
                 "Computers & Technology"
-            ]
+            ],
+            "similarity_settings": {
+                "enabled": True,
+                "index_path": None,
+                "threshold": 0.8,
+                "num_perm": 128,
+                "bands": 16,
+                "shingle_size": 5
+            }
         }
         
         if config_path and os.path.exists(config_path):
@@ -83,6 +406,10 @@ class KDPConverter:
         with open(index_path, 'r', encoding='utf-8') as f:
             content = f.read()
             
+        return self.parse_book_metadata(content)
+    
+    def parse_book_metadata(self, content: str) -> Dict:
+        """index.mdの内容からメタデータ抽出"""
         # Front matterからメタデータ抽出
         metadata = {}
         if content.startswith('---'):
@@ -113,7 +440,7 @@ class KDPConverter:
     
     def process_markdown_files(self, book_path: str) -> List[Dict]:
         """Markdownファイル処理"""
-        processed_chapters = []
+        sources = []
         
         # 章ファイルを順序通りに処理
         chapter_files = sorted(
@@ -124,8 +451,16 @@ class KDPConverter:
             chapter_path = os.path.join(book_path, chapter_file)
             
             with open(chapter_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+                sources.append((chapter_file, f.read()))
                 
+        return self.render_chapters(sources, book_path)
+    
+    def render_chapters(self, sources: List[tuple], book_path: str = None) -> List[Dict]:
+        """章Markdown（ファイル名, 本文）のHTML変換"""
+        processed_chapters = []
+        max_bytes = self.config['epub_settings'].get('max_xhtml_bytes')
+        
+        for chapter_file, content in sources:
             # Front matter除去
             if content.startswith('---'):
                 end_pos = content.find('---', 3)
@@ -139,16 +474,53 @@ class KDPConverter:
             )
             
             # 画像パス修正（相対パス → 絶対パス）
-            html_content = self._fix_image_paths(html_content, book_path)
+            if book_path:
+                html_content = self._fix_image_paths(html_content, book_path)
             
             processed_chapters.append({
                 'filename': chapter_file,
-                'html_content': html_content,
+                # 分割済みパートのみ保持（全文HTMLは保持しない）
+                'html_parts': self._split_html(html_content, max_bytes),
+                'markdown': content,
                 'word_count': len(content.split())
             })
             
         return processed_chapters
     
+    def _split_html(self, html_content: str, max_bytes: Optional[int]) -> List[str]:
+        """章HTMLを見出し・段落境界でバイト上限以下のパートに分割
+
+        上限を超える単一ブロック（巨大な表など）は分割せずそのまま1パートにする。
+        """
+        if not max_bytes or len(html_content.encode('utf-8')) <= max_bytes:
+            return [html_content]
+        
+        soup = BeautifulSoup(html_content, 'html.parser')
+        parts = []
+        current = []
+        current_bytes = 0
+        
+        for node in soup.contents:
+            block = str(node)
+            size = len(block.encode('utf-8'))
+            is_heading = getattr(node, 'name', None) in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+            
+            # 上限超過時、または半分以上埋まった状態で見出しが来たら改パート
+            if current_bytes and (current_bytes + size > max_bytes
+                                  or (is_heading and current_bytes >= max_bytes // 2)):
+                parts.append(''.join(current))
+                current, current_bytes = [], 0
+            
+            if not current and not block.strip():
+                continue
+            current.append(block)
+            current_bytes += size
+        
+        if current:
+            parts.append(''.join(current))
+        
+        return parts or [html_content]
+    
     def _fix_image_paths(self, html_content: str, book_path: str) -> str:
         """画像パス修正"""
         soup = BeautifulSoup(html_content, 'html.parser')
@@ -260,27 +632,32 @@ class KDPConverter:
         for i, chapter in enumerate(chapters):
             chapter_id = f"chapter_{i+1:02d}"
             
-            epub_chapter = epub.EpubHtml(
-                title=f"Chapter {i+1}",
-                file_name=f"{chapter_id}.xhtml",
-                lang=self.config['epub_settings']['language']
-            )
-            epub_chapter.content = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <title>Chapter {i+1}</title>
-                <meta charset="utf-8"/>
-            </head>
-            <body>
-                {chapter['html_content']}
-            </body>
-            </html>
-            """
-            
-            book.add_item(epub_chapter)
-            epub_chapters.append(epub_chapter)
-            spine.append(epub_chapter)
+            # 大きな章は複数のXHTMLに分割（目次は先頭パートを指す）
+            for j, html_part in enumerate(chapter['html_parts']):
+                part_id = chapter_id if j == 0 else f"{chapter_id}_{j+1:02d}"
+                
+                epub_chapter = epub.EpubHtml(
+                    title=f"Chapter {i+1}",
+                    file_name=f"{part_id}.xhtml",
+                    lang=self.config['epub_settings']['language']
+                )
+                epub_chapter.content = f"""
+                <!DOCTYPE html>
+                <html>
+                <head>
+                    <title>Chapter {i+1}</title>
+                    <meta charset="utf-8"/>
+                </head>
+                <body>
+                    {html_part}
+                </body>
+                </html>
+                """
+                
+                book.add_item(epub_chapter)
+                spine.append(epub_chapter)
+                if j == 0:
+                    epub_chapters.append(epub_chapter)
         
         # 目次作成
         book.toc = [(epub.Section('Chapters'), epub_chapters)]
@@ -301,7 +678,7 @@ class KDPConverter:
         
         return epub_path
     
-    def create_pdf_via_pandoc(self, metadata: Dict, book_path: str) -> str:
+    def create_pdf_via_pandoc(self, metadata: Dict, chapters: List[Dict]) -> str:
         """Pandoc経由でPDF作成"""
         import subprocess
         
@@ -317,23 +694,9 @@ class KDPConverter:
             outfile.write(f"language: ja\n")
             outfile.write(f"---\n\n")
             
-            # 章ファイル統合
-            chapter_files = [f for f in os.listdir(book_path) 
-                           if f.endswith('.md') and f != 'index.md']
-            chapter_files.sort()
-            
-            for chapter_file in chapter_files:
-                chapter_path = os.path.join(book_path, chapter_file)
-                with open(chapter_path, 'r', encoding='utf-8') as infile:
-                    content = infile.read()
-                    
-                    # Front matter除去
-                    if content.startswith('---'):
-                        end_pos = content.find('---', 3)
-                        if end_pos != -1:
-                            content = content[end_pos + 3:].strip()
-                    
-                    outfile.write(content + '\n\n\\newpage\n\n')
+            # 章統合（Front matter除去済み）
+            for chapter in chapters:
+                outfile.write(chapter['markdown'] + '\n\n\\newpage\n\n')
         
         # PDF生成
         pdf_filename = f"{metadata.get('title', 'book').replace(' ', '_')}.pdf"
@@ -359,12 +722,320 @@ class KDPConverter:
             logger.error(f"PDF作成エラー: {e}")
             return None
     
+    # 行頭禁則・行末禁則文字（簡易版）
+    KINSOKU_HEAD = set('、。，．,.・：；:;？！?!ー～…‥」』）)】〕〉》］]｝}’”'
+                       'ぁぃぅぇぉっゃゅょゎァィゥェォッャュョヮヵヶ々ゝゞヽヾ')
+    KINSOKU_TAIL = set('「『（(【〔〈《［[｛{‘“')
+
+    # font_path未指定時に探す埋め込み可能な日本語TrueTypeフォント
+    PDF_FONT_CANDIDATES = [
+        '/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf',
+        '/usr/share/fonts/opentype/ipaexfont-gothic/ipaexg.ttf',
+        '/usr/share/fonts/truetype/fonts-japanese-gothic.ttf',
+        '/usr/share/fonts/truetype/takao-gothic/TakaoGothic.ttf',
+        '/Library/Fonts/Arial Unicode.ttf',
+        'C:/Windows/Fonts/msgothic.ttc'
+    ]
+
+    def register_pdf_font(self) -> str:
+        """PDF用フォント登録（使用グリフのみサブセット埋め込み）
+
+        KDPは非埋め込みフォントのPDFを受け付けないため、埋め込み可能な
+        TrueTypeフォントが見つからない場合はRuntimeErrorを送出する。
+        """
+        if getattr(self, '_pdf_font_name', None):
+            return self._pdf_font_name
+
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont, TTFError
+
+        font_path = self.config['pdf_settings'].get('font_path')
+        if font_path:
+            if not os.path.exists(font_path):
+                raise RuntimeError(f"フォントが見つかりません: {font_path}")
+        else:
+            font_path = next((p for p in self.PDF_FONT_CANDIDATES if os.path.exists(p)), None)
+            if not font_path:
+                raise RuntimeError(
+                    "埋め込み可能な日本語TrueTypeフォントが見つかりません: "
+                    "pdf_settings.font_path を指定してください（例: fonts-ipafont-gothic の ipag.ttf）"
+                )
+
+        try:
+            # TrueTypeアウトラインのみ対応（CFFベースのOTF/OTCは不可）
+            pdfmetrics.registerFont(TTFont('KDPBody', font_path))
+        except TTFError as e:
+            raise RuntimeError(f"TrueTypeフォントとして読み込めません: {font_path} ({e})")
+
+        logger.info(f"PDFフォント: {font_path}")
+        self._pdf_font_name = 'KDPBody'
+        return self._pdf_font_name
+
+    def _html_to_blocks(self, html_content: str) -> List[Dict]:
+        """レンダリング済みHTMLをレイアウト用ブロックに分解"""
+        soup = BeautifulSoup(html_content, 'html.parser')
+        blocks = []
+
+        for element in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+                                      'p', 'li', 'pre', 'blockquote', 'tr', 'hr']):
+            # 入れ子の要素は親ブロックで出力済み
+            if element.find_parent(['li', 'pre', 'blockquote', 'tr']):
+                continue
+            if element.name == 'p' and element.find_parent('li'):
+                continue
+
+            if element.name == 'hr':
+                blocks.append({'kind': 'hr', 'text': ''})
+                continue
+
+            if element.name == 'tr':
+                text = ' | '.join(cell.get_text(' ', strip=True)
+                                  for cell in element.find_all(['th', 'td']))
+            elif element.name == 'pre':
+                text = element.get_text()
+            else:
+                text = ' '.join(element.get_text(' ').split())
+
+            if not text.strip():
+                continue
+
+            if element.name == 'li':
+                parent = element.parent
+                if parent is not None and parent.name == 'ol':
+                    # 番号付きリストは番号を維持（start属性にも対応）
+                    items = parent.find_all('li', recursive=False)
+                    try:
+                        start = int(parent.get('start', 1))
+                    except ValueError:
+                        start = 1
+                    text = f"{start + items.index(element)}. {text}"
+                else:
+                    text = f"・{text}"
+            blocks.append({'kind': element.name, 'text': text})
+
+        return blocks
+
+    def _break_lines(self, text: str, font_name: str, font_size: float, max_width: float) -> List[str]:
+        """CJK対応の行分割（禁則処理付き）"""
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+
+        # 英数字の連続は1単位、それ以外は1文字ずつ折り返し可能
+        units = re.findall(r'[A-Za-z0-9@#$%&_/.:-]+|\s+|.', text)
+        lines = []
+        current = ''
+        current_width = 0.0
+
+        for k, unit in enumerate(units):
+            if unit.isspace():
+                unit = ' '
+                if not current:
+                    continue
+            unit_width = stringWidth(unit, font_name, font_size)
+
+            if current and current_width + unit_width > max_width:
+                if unit in self.KINSOKU_HEAD:
+                    run_length = 1
+                    while k + run_length < len(units) and units[k + run_length] in self.KINSOKU_HEAD:
+                        run_length += 1
+
+                    if run_length == 1:
+                        # 単独の行頭禁則文字は1文字だけぶら下げ
+                        lines.append(current + unit)
+                        current, current_width = '', 0.0
+                        continue
+
+                    # 連続する場合（「。」」等）は直前の1文字を次行へ追い出す
+                    # 追い出せない場合（禁則文字のみの行など）は強制改行
+                    previous = current[-1]
+                    if len(current) > 1 and previous not in self.KINSOKU_HEAD and not previous.isspace():
+                        lines.append(current[:-1].rstrip())
+                        current = previous
+                    else:
+                        lines.append(current.rstrip())
+                        current = ''
+                    current += unit
+                    current_width = stringWidth(current, font_name, font_size)
+                    continue
+
+                # 行末禁則文字は次行へ送る（行全体が禁則文字なら強制改行）
+                stripped = current.rstrip(''.join(self.KINSOKU_TAIL))
+                if stripped.strip():
+                    carry = current[len(stripped):]
+                    current = stripped
+                else:
+                    carry = ''
+                lines.append(current.rstrip())
+                current = carry
+                current_width = stringWidth(current, font_name, font_size)
+                if unit == ' ':
+                    continue
+
+            # 1単位が行幅を超える場合は文字単位で分割
+            if unit_width > max_width:
+                for char in unit:
+                    char_width = stringWidth(char, font_name, font_size)
+                    if current and current_width + char_width > max_width:
+                        lines.append(current)
+                        current, current_width = '', 0.0
+                    current += char
+                    current_width += char_width
+                continue
+
+            current += unit
+            current_width += unit_width
+
+        if current.strip():
+            lines.append(current.rstrip())
+        return lines
+
+    def create_pdf_native(self, metadata: Dict, chapters: List[Dict]) -> Optional[str]:
+        """内蔵エンジンでPDF作成（pandoc/xelatex不要）
+
+        レンダリング済みの章HTMLをA5版面に組版する。reportlabはページ内容を
+        save()まで非圧縮のままメモリに保持するため、ファイルへの書き出しは
+        最後に一括で行われ、使用メモリは書籍全体の大きさに比例する。
+        """
+        try:
+            from reportlab.pdfgen import canvas
+            from reportlab.lib import pagesizes
+            from reportlab.lib.units import mm
+        except ImportError:
+            logger.error("reportlabが見つかりません: pip install reportlab")
+            return None
+
+        settings = self.config['pdf_settings']
+        page_width, page_height = getattr(pagesizes, settings.get('page_size', 'A5').upper(), pagesizes.A5)
+        margin = settings.get('margin', 20) * mm
+        base_size = settings.get('font_size', 10.5)
+        leading_ratio = settings.get('line_height', 1.7)
+        try:
+            font_name = self.register_pdf_font()
+        except RuntimeError as e:
+            logger.error(f"PDF作成エラー: {e}")
+            return None
+
+        # 見出しレベル別の文字サイズ倍率
+        scale = {'h1': 1.8, 'h2': 1.5, 'h3': 1.3, 'h4': 1.15, 'h5': 1.05, 'h6': 1.0}
+        max_width = page_width - margin * 2
+        title = metadata.get('title', 'AI Generated Book')
+
+        pdf_filename = f"{title.replace(' ', '_')}.pdf"
+        pdf_path = os.path.join(self.temp_dir, pdf_filename)
+
+        # 初期フォントも埋め込みフォントにする（非埋め込みのHelvetica参照を避ける）
+        pdf = canvas.Canvas(pdf_path, pagesize=(page_width, page_height), pageCompression=1,
+                            initialFontName=font_name, initialFontSize=base_size)
+        pdf.setTitle(title)
+        pdf.setAuthor(metadata.get('author', 'AI Generated'))
+
+        state = {'page': 0, 'y': 0.0}
+
+        def start_page(numbered: bool = True):
+            state['page'] += 1
+            state['y'] = page_height - margin
+            if numbered:
+                pdf.setFont(font_name, base_size * 0.8)
+                pdf.drawCentredString(page_width / 2, margin / 2, str(state['page']))
+
+        def ensure_space(height: float):
+            # 下余白に掛かる場合は改ページ
+            if state['y'] - height < margin:
+                end_page()
+                start_page()
+
+        def end_page():
+            # ページ確定（ファイルへの書き出しはpdf.save()時）
+            pdf.showPage()
+
+        # 扉ページ（ノンブルなし）
+        start_page(numbered=False)
+        pdf.setFont(font_name, base_size * 2)
+        for i, line in enumerate(self._break_lines(title, font_name, base_size * 2, max_width)):
+            pdf.drawCentredString(page_width / 2, page_height * 0.6 - i * base_size * 3, line)
+        pdf.setFont(font_name, base_size * 1.2)
+        pdf.drawCentredString(page_width / 2, page_height * 0.4, metadata.get('author', 'AI Generated'))
+        end_page()
+
+        for chapter in chapters:
+            start_page()
+
+            blocks = (block for html_part in chapter['html_parts']
+                      for block in self._html_to_blocks(html_part))
+            for block in blocks:
+                size = base_size * scale.get(block['kind'], 1.0)
+                leading = size * leading_ratio
+
+                if block['kind'] == 'hr':
+                    ensure_space(leading)
+                    state['y'] -= leading / 2
+                    pdf.line(margin, state['y'], page_width - margin, state['y'])
+                    state['y'] -= leading / 2
+                    continue
+
+                indent = size if block['kind'] in ('blockquote', 'pre') else 0
+                if block['kind'] in scale:
+                    # 見出し前の余白
+                    state['y'] -= leading / 2
+
+                lines = []
+                for raw_line in block['text'].split('\n'):
+                    lines.extend(self._break_lines(raw_line, font_name, size, max_width - indent) or [''])
+
+                for line in lines:
+                    ensure_space(leading)
+                    state['y'] -= leading
+                    pdf.setFont(font_name, size)
+                    pdf.drawString(margin + indent, state['y'], line)
+
+                state['y'] -= size * 0.5
+
+            end_page()
+
+        pdf.save()
+        logger.info(f"PDF作成完了（内蔵エンジン, {state['page']}ページ）: {pdf_path}")
+        return pdf_path
+
+    def check_duplicates(self, book: str, chapters: List[Dict], output_dir: str) -> Dict:
+        """ライブラリ全体の類似索引と照合して重複章・重複書籍を検出"""
+        settings = self.config['similarity_settings']
+        index_path = settings.get('index_path') or os.path.join(output_dir, '.similarity-index.json')
+
+        index = getattr(self, '_similarity_index', None)
+        if index is None or index.index_path != index_path:
+            self.save_similarity_index()
+            index = SimilarityIndex(
+                index_path,
+                num_perm=settings.get('num_perm', 128),
+                bands=settings.get('bands', 16),
+                shingle_size=settings.get('shingle_size', 5)
+            )
+            self._similarity_index = index
+
+        report = index.check_book(book, chapters, settings.get('threshold', 0.8))
+
+        for item in report['chapters']:
+            for match in item['matches']:
+                logger.warning(
+                    f"⚠️ 類似章検出: {book}/{item['chapter']} ≈ "
+                    f"{match['book']}/{match['label']} ({match['similarity']:.0%})"
+                )
+        for match in report['book']:
+            logger.warning(f"⚠️ 類似書籍検出: {book} ≈ {match['book']} ({match['similarity']:.0%})")
+
+        return report
+
+    def save_similarity_index(self):
+        """類似索引の保存（実行終了時・ワーカー終了時に呼ぶ）"""
+        index = getattr(self, '_similarity_index', None)
+        if index is not None:
+            index.save()
+
     def generate_kdp_package(self, book_path: str, output_dir: str = None) -> Dict:
         """KDPパッケージ生成"""
         if not output_dir:
             output_dir = os.path.join(os.getcwd(), 'kdp-output')
             
-        os.makedirs(output_dir, exist_ok=True)
+        started = time.perf_counter()
         
         try:
             # メタデータ抽出
@@ -375,12 +1046,49 @@ class KDPConverter:
             logger.info("Markdownファイル処理中...")
             chapters = self.process_markdown_files(book_path)
             
+        except Exception as e:
+            logger.error(f"❌ 変換エラー: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+        
+        book = os.path.basename(os.path.normpath(book_path))
+        timings = {'load': round(time.perf_counter() - started, 3)}
+        return self.build_kdp_package(book, metadata, chapters, output_dir, timings)
+    
+    def build_kdp_package(self, book: str, metadata: Dict, chapters: List[Dict], output_dir: str,
+                          timings: Dict = None) -> Dict:
+        """読み込み済みの書籍からKDPパッケージ生成"""
+        # 書籍ごとに出力ディレクトリを分離（cover.png等の上書き防止）
+        book_output_dir = os.path.join(output_dir, book)
+        os.makedirs(book_output_dir, exist_ok=True)
+        
+        # 工程別の処理時間（シャード分割の重み付けに使用）
+        timings = dict(timings or {})
+        stage_started = time.perf_counter()
+        
+        def finish_stage(name: str):
+            nonlocal stage_started
+            now = time.perf_counter()
+            timings[name] = round(now - stage_started, 3)
+            stage_started = now
+        
+        try:
+            # 類似コンテンツ検出
+            duplicates = None
+            if self.config['similarity_settings'].get('enabled', True):
+                logger.info("類似コンテンツ検出中...")
+                duplicates = self.check_duplicates(book, chapters, output_dir)
+                finish_stage('similarity')
+            
             # カバー画像生成
             logger.info("カバー画像生成中...")
             cover_path = self.generate_cover_image(
                 metadata.get('title', 'AI Generated Book'),
                 metadata.get('author', 'AI Generated')
             )
+            finish_stage('cover')
             
             # フォーマット変換
             converted_files = {}
@@ -389,21 +1097,26 @@ class KDPConverter:
                 logger.info("EPUB変換中...")
                 epub_path = self.create_epub(metadata, chapters, cover_path)
                 if epub_path:
-                    final_epub = os.path.join(output_dir, os.path.basename(epub_path))
-                    os.rename(epub_path, final_epub)
+                    final_epub = os.path.join(book_output_dir, os.path.basename(epub_path))
+                    shutil.move(epub_path, final_epub)
                     converted_files['epub'] = final_epub
+                finish_stage('epub')
             
             if 'pdf' in self.config['output_formats']:
                 logger.info("PDF変換中...")
-                pdf_path = self.create_pdf_via_pandoc(metadata, book_path)
+                if self.config['pdf_settings'].get('engine') == 'native':
+                    pdf_path = self.create_pdf_native(metadata, chapters)
+                else:
+                    pdf_path = self.create_pdf_via_pandoc(metadata, chapters)
                 if pdf_path:
-                    final_pdf = os.path.join(output_dir, os.path.basename(pdf_path))
-                    os.rename(pdf_path, final_pdf)
+                    final_pdf = os.path.join(book_output_dir, os.path.basename(pdf_path))
+                    shutil.move(pdf_path, final_pdf)
                     converted_files['pdf'] = final_pdf
+                finish_stage('pdf')
             
             # カバー画像コピー
-            final_cover = os.path.join(output_dir, 'cover.png')
-            os.rename(cover_path, final_cover)
+            final_cover = os.path.join(book_output_dir, 'cover.png')
+            shutil.move(cover_path, final_cover)
             converted_files['cover'] = final_cover
             
             # KDPメタデータJSON生成
@@ -419,20 +1132,25 @@ class KDPConverter:
                 'statistics': {
                     'total_chapters': len(chapters),
                     'total_words': sum(ch['word_count'] for ch in chapters),
-                    'formats': list(converted_files.keys())
+                    'formats': list(converted_files.keys()),
+                    'timings': {**timings, 'total': round(sum(timings.values()), 3)}
                 }
             }
             
-            metadata_path = os.path.join(output_dir, 'kdp-metadata.json')
+            if duplicates is not None:
+                kdp_metadata['duplicates'] = duplicates
+            
+            metadata_path = os.path.join(book_output_dir, 'kdp-metadata.json')
             with open(metadata_path, 'w', encoding='utf-8') as f:
                 json.dump(kdp_metadata, f, ensure_ascii=False, indent=2)
             
-            logger.info(f"✅ KDPパッケージ生成完了: {output_dir}")
+            logger.info(f"✅ KDPパッケージ生成完了: {book_output_dir}")
             
             return {
                 'success': True,
-                'output_dir': output_dir,
+                'output_dir': book_output_dir,
                 'files': converted_files,
+                'metadata_file': metadata_path,
                 'metadata': kdp_metadata
             }
             
@@ -445,45 +1163,387 @@ class KDPConverter:
     
     def cleanup(self):
         """一時ファイル削除"""
-        import shutil
         if os.path.exists(self.temp_dir):
             shutil.rmtree(self.temp_dir)
             logger.info("一時ファイル削除完了")
+    
+    def handle_worker_request(self, request: Dict, default_output_dir: str) -> Dict:
+        """ワーカーモードの変換リクエスト処理
+
+        book_path指定時はディスク上の書籍を、それ以外はインラインの
+        index/metadata/chaptersをファイルを介さずに変換する。
+        """
+        output_dir = request.get('output_dir') or default_output_dir
+        
+        if request.get('book_path'):
+            if not os.path.exists(request['book_path']):
+                raise FileNotFoundError(f"{request['book_path']} が見つかりません")
+            result = self.generate_kdp_package(request['book_path'], output_dir)
+        else:
+            book = request.get('book')
+            if not book or os.path.basename(book) != book or book in ('.', '..'):
+                raise ValueError("'book' must be a plain directory name")
+            
+            metadata = self.parse_book_metadata(request['index']) if request.get('index') else {}
+            metadata.update(request.get('metadata', {}))
+            
+            sources = [
+                (chapter.get('filename') or f"chapter-{i+1}.md", chapter['markdown'])
+                for i, chapter in enumerate(request.get('chapters', []))
+            ]
+            if not sources:
+                raise ValueError("'chapters' must contain at least one chapter")
+            
+            result = self.build_kdp_package(book, metadata, self.render_chapters(sources), output_dir)
+        
+        return {'id': request.get('id'), **result}
+
+def serve_worker_lines(converter: KDPConverter, output_dir: str, lines, write) -> bool:
+    """JSON Lines形式のリクエストを1行ずつ処理して結果を書き出す
+
+    shutdownコマンドを受け取った場合はFalseを返す。
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            write(json.dumps({'id': None, 'success': False, 'error': f"invalid request: {e}"}) + '\n')
+            continue
+        
+        command = request.get('command', 'convert')
+        if command == 'shutdown':
+            write(json.dumps({'id': request.get('id'), 'success': True, 'command': 'shutdown'}) + '\n')
+            return False
+        
+        if command == 'ping':
+            response = {'id': request.get('id'), 'success': True, 'command': 'ping'}
+        else:
+            try:
+                response = converter.handle_worker_request(request, output_dir)
+            except Exception as e:
+                logger.error(f"❌ リクエスト処理エラー: {str(e)}")
+                response = {'id': request.get('id'), 'success': False, 'error': str(e)}
+        
+        write(json.dumps(response, ensure_ascii=False) + '\n')
+    
+    return True
+
+def run_worker(converter: KDPConverter, output_dir: str, socket_path: str = None) -> int:
+    """常駐ワーカーモード（stdin/stdout または Unixドメインソケット）
+
+    import・フォント・類似索引をプロセス内に保持したまま複数冊を変換する。
+    """
+    if not socket_path:
+        def write_stdout(data: str):
+            sys.stdout.write(data)
+            sys.stdout.flush()
+        
+        logger.info("🔁 ワーカーモード開始 (stdin)")
+        serve_worker_lines(converter, output_dir, sys.stdin, write_stdout)
+        return 0
+    
+    import io
+    import socketserver
+    
+    state = {'running': True}
+    
+    class WorkerHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            def write_socket(data: str):
+                self.wfile.write(data.encode('utf-8'))
+                self.wfile.flush()
+            
+            lines = io.TextIOWrapper(self.rfile, encoding='utf-8')
+            if not serve_worker_lines(converter, output_dir, lines, write_socket):
+                state['running'] = False
+    
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    
+    logger.info(f"🔁 ワーカーモード開始 (socket: {socket_path})")
+    with socketserver.UnixStreamServer(socket_path, WorkerHandler) as server:
+        try:
+            while state['running']:
+                server.handle_request()
+        finally:
+            os.remove(socket_path)
+    
+    return 0
+
+def parse_shard(value: str) -> tuple:
+    """--shard i/N の解析（iは1始まり）"""
+    match = re.fullmatch(r'(\d+)/(\d+)', value.strip())
+    if not match:
+        raise ValueError(f"shard must be in the form i/N: {value}")
+    index, count = int(match.group(1)), int(match.group(2))
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"shard index out of range: {value}")
+    return index, count
+
+def book_key(book_path: str) -> str:
+    """マシン・作業ディレクトリに依存しない書籍キー"""
+    return os.path.basename(os.path.normpath(book_path))
+
+def book_size(book_path: str) -> int:
+    """章Markdownの合計バイト数"""
+    return sum(
+        os.path.getsize(os.path.join(book_path, f))
+        for f in os.listdir(book_path) if f.endswith('.md') and f != 'index.md'
+    )
+
+def load_shard_timings(report_path: str) -> Dict[str, float]:
+    """過去の統合レポートから書籍別の処理時間を取得"""
+    with open(report_path, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+    
+    timings = {}
+    for key, book in report.get('books', {}).items():
+        total = book.get('statistics', {}).get('timings', {}).get('total')
+        if total is not None:
+            timings[key] = total
+    return timings
+
+def select_shard(book_paths: List[str], index: int, count: int,
+                 weights: Optional[Dict[str, float]] = None) -> List[str]:
+    """書籍を決定的にシャードへ分配し、index番目のシャードの書籍を返す
+
+    重みなしの場合は書籍キーの安定ハッシュで分配する。重みありの場合は
+    重い順に最も負荷の少ないシャードへ割り当てる（全ランナーで同じ結果になる）。
+    """
+    if weights is None:
+        return [
+            path for path in book_paths
+            if int(hashlib.sha1(book_key(path).encode('utf-8')).hexdigest(), 16) % count == index - 1
+        ]
+    
+    loads = [0.0] * count
+    assignment = {}
+    for path in sorted(book_paths, key=lambda p: (-weights[book_key(p)], book_key(p))):
+        shard = min(range(count), key=lambda i: (loads[i], i))
+        loads[shard] += weights[book_key(path)]
+        assignment[path] = shard
+    
+    return [path for path in book_paths if assignment[path] == index - 1]
+
+SIMILARITY_INDEX_NAMES = ('similarity-index.json', '.similarity-index.json')
+
+def merge_similarity_indexes(report_dirs: List[str], converted: Dict[str, set],
+                             settings: Dict, index_path: str = None) -> SimilarityIndex:
+    """シャードごとの類似索引を1つに統合
+
+    各シャードの索引は共通の既存索引＋そのシャードの書籍を含むため、
+    まず全索引を取り込んだ後、変換した書籍のエントリはそのシャードの
+    索引のものに置き換える（再変換で消えた章を残さないため）。
+    """
+    index = SimilarityIndex(
+        index_path,
+        num_perm=settings.get('num_perm', 128),
+        bands=settings.get('bands', 16),
+        shingle_size=settings.get('shingle_size', 5)
+    )
+    
+    index_files = {}
+    for report_dir in report_dirs:
+        index_files[report_dir] = sorted(
+            os.path.join(root, name)
+            for root, dirs, files in os.walk(report_dir)
+            for name in files if name in SIMILARITY_INDEX_NAMES
+        )
+        for path in index_files[report_dir]:
+            index.load(path)
+    
+    for report_dir in report_dirs:
+        for book in converted.get(report_dir, ()):
+            index.remove_book(book)
+        for path in index_files[report_dir]:
+            index.load(path, books=converted.get(report_dir, set()))
+    
+    return index
+
+def merge_shard_reports(report_dirs: List[str], output_path: str,
+                        similarity_settings: Optional[Dict] = None,
+                        index_path: str = None) -> Dict:
+    """シャードごとのkdp-metadata.jsonを1つのレポートに統合
+
+    similarity_settingsを指定すると、シャードの類似索引を統合して
+    変換済み書籍の重複検出をやり直す（シャードをまたぐ重複も検出する）。
+    """
+    books = {}
+    converted = {}
+    for report_dir in report_dirs:
+        for root, dirs, files in os.walk(report_dir):
+            if 'kdp-metadata.json' in files:
+                with open(os.path.join(root, 'kdp-metadata.json'), 'r', encoding='utf-8') as f:
+                    books[os.path.basename(root)] = json.load(f)
+                converted.setdefault(report_dir, set()).add(os.path.basename(root))
+    
+    if similarity_settings and similarity_settings.get('enabled', True):
+        index = merge_similarity_indexes(report_dirs, converted, similarity_settings, index_path)
+        threshold = similarity_settings.get('threshold', 0.8)
+        for key, book in books.items():
+            book['duplicates'] = index.recheck_book(key, threshold)
+        # 統合した索引はどのシャードの索引とも異なるため、指定があれば必ず保存
+        index.dirty = True
+        index.save()
+    
+    formats = {}
+    for book in books.values():
+        for format_type in book.get('statistics', {}).get('formats', []):
+            formats[format_type] = formats.get(format_type, 0) + 1
+    
+    report = {
+        'generated_at': datetime.now().isoformat(),
+        'sources': report_dirs,
+        'books': dict(sorted(books.items())),
+        'statistics': {
+            'total_books': len(books),
+            'total_chapters': sum(b.get('statistics', {}).get('total_chapters', 0) for b in books.values()),
+            'total_words': sum(b.get('statistics', {}).get('total_words', 0) for b in books.values()),
+            'formats': formats,
+            'books_with_duplicates': sorted(
+                key for key, b in books.items()
+                if b.get('duplicates', {}).get('chapters') or b.get('duplicates', {}).get('book')
+            ),
+            'total_seconds': round(sum(
+                b.get('statistics', {}).get('timings', {}).get('total', 0) for b in books.values()
+            ), 3)
+        }
+    }
+    
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    
+    logger.info(f"📊 統合レポート作成完了: {output_path} ({len(books)}冊)")
+    return report
 
 def main():
     """メイン実行関数"""
     import argparse
     
     parser = argparse.ArgumentParser(description='Markdown to KDP Converter')
-    parser.add_argument('book_path', help='書籍ディレクトリパス')
+    parser.add_argument('book_paths', nargs='*', help='書籍ディレクトリパス（複数指定可）')
     parser.add_argument('--output', '-o', help='出力ディレクトリ', default='kdp-output')
     parser.add_argument('--config', '-c', help='設定ファイルパス')
+    parser.add_argument('--pdf-engine', choices=['pandoc', 'native'],
+                        help='PDF生成エンジン（native: pandoc/xelatex不要の内蔵エンジン）')
+    parser.add_argument('--similarity-index', help='類似コンテンツ索引ファイルパス')
+    parser.add_argument('--no-similarity', action='store_true', help='類似コンテンツ検出を無効化')
+    parser.add_argument('--bundle', '-b', help='全成果物をまとめるアーカイブパス（例: kdp-output/kdp-ready-files.zip）')
+    parser.add_argument('--worker', action='store_true',
+                        help='常駐ワーカーモード（JSON Linesのリクエストを標準入力から処理）')
+    parser.add_argument('--socket', help='ワーカーモードで待ち受けるUnixドメインソケットパス')
+    parser.add_argument('--shard', help='指定シャードの書籍のみ変換（例: 2/4）')
+    parser.add_argument('--shard-balance', choices=['hash', 'size', 'timings'], default='hash',
+                        help='シャード分配方法（hash: パスの安定ハッシュ, size: 章サイズ, timings: 過去の処理時間）')
+    parser.add_argument('--shard-timings', help='--shard-balance timings で使う過去の統合レポート')
+    parser.add_argument('--merge', nargs='+', metavar='DIR',
+                        help='シャードごとの出力ディレクトリを統合レポートにまとめる（類似索引も統合して重複を再検出）')
+    parser.add_argument('--report', default='kdp-report.json', help='統合レポート出力パス（--merge用）')
     
     args = parser.parse_args()
     
-    if not os.path.exists(args.book_path):
-        print(f"❌ エラー: {args.book_path} が見つかりません")
-        return 1
+    if args.merge:
+        # 設定（類似検出パラメータ）のみ使用
+        converter = KDPConverter(args.config)
+        converter.cleanup()
+        similarity_settings = None if args.no_similarity else converter.config['similarity_settings']
+        report = merge_shard_reports(args.merge, args.report, similarity_settings, args.similarity_index)
+        print(f"📊 統合レポート: {args.report}")
+        print(f"📊 統計: {report['statistics']}")
+        return 0
+    
+    if not args.worker and not args.book_paths:
+        parser.error('書籍ディレクトリパスを指定してください（または --worker）')
+    
+    for book_path in args.book_paths:
+        if not os.path.exists(book_path):
+            print(f"❌ エラー: {book_path} が見つかりません")
+            return 1
+    
+    if args.shard:
+        try:
+            shard_index, shard_count = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+        
+        weights = None
+        if args.shard_balance == 'size':
+            weights = {book_key(p): book_size(p) for p in args.book_paths}
+        elif args.shard_balance == 'timings':
+            if not args.shard_timings:
+                parser.error('--shard-balance timings には --shard-timings が必要です')
+            history = load_shard_timings(args.shard_timings)
+            # 未計測の書籍は計測済み書籍の平均値で見積もる
+            default = sum(history.values()) / len(history) if history else 1.0
+            weights = {book_key(p): history.get(book_key(p), default) for p in args.book_paths}
+        
+        args.book_paths = select_shard(args.book_paths, shard_index, shard_count, weights)
+        print(f"🧩 シャード {shard_index}/{shard_count}: {len(args.book_paths)}冊")
     
     converter = KDPConverter(args.config)
+    if args.pdf_engine:
+        converter.config['pdf_settings']['engine'] = args.pdf_engine
+    if args.similarity_index:
+        converter.config['similarity_settings']['index_path'] = args.similarity_index
+    if args.no_similarity:
+        converter.config['similarity_settings']['enabled'] = False
+    
+    # 内蔵PDFエンジンは埋め込みフォント必須のため起動時に検証
+    if ('pdf' in converter.config['output_formats']
+            and converter.config['pdf_settings'].get('engine') == 'native'):
+        try:
+            converter.register_pdf_font()
+        except RuntimeError as e:
+            print(f"❌ エラー: {e}")
+            converter.cleanup()
+            return 1
+    
+    if args.worker:
+        try:
+            return run_worker(converter, args.output, args.socket)
+        finally:
+            converter.save_similarity_index()
+            converter.cleanup()
+    
+    bundle = ArtifactBundle(args.bundle, args.output) if args.bundle else None
+    failures = 0
     
     try:
-        result = converter.generate_kdp_package(args.book_path, args.output)
-        
-        if result['success']:
-            print(f"🎉 変換完了!")
-            print(f"📁 出力先: {result['output_dir']}")
-            print(f"📊 統計: {result['metadata']['statistics']}")
+        for book_path in args.book_paths:
+            result = converter.generate_kdp_package(book_path, args.output)
             
-            for format_type, file_path in result['files'].items():
-                print(f"  - {format_type.upper()}: {file_path}")
+            if result['success']:
+                print(f"🎉 変換完了!")
+                print(f"📁 出力先: {result['output_dir']}")
+                print(f"📊 統計: {result['metadata']['statistics']}")
                 
-            return 0
-        else:
-            print(f"❌ 変換失敗: {result['error']}")
-            return 1
+                for format_type, file_path in result['files'].items():
+                    print(f"  - {format_type.upper()}: {file_path}")
+                
+                if bundle:
+                    bundle.add_package(result)
+            else:
+                print(f"❌ 変換失敗: {book_path}: {result['error']}")
+                failures += 1
+        
+        if bundle:
+            print(f"📦 バンドル: {bundle.close()}")
+            
+        return 1 if failures else 0
             
     finally:
+        if bundle:
+            bundle.abort()
+        converter.save_similarity_index()
         converter.cleanup()
 
 if __name__ == '__main__':
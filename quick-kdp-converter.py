@@ -16,8 +16,12 @@ import xml.etree.ElementTree as ET
 class QuickKDPConverter:
     """簡易KDP変換システム（依存関係最小版）"""
     
-    def __init__(self):
+    # 1つのXHTMLファイルの上限サイズ（超える章は分割）
+    MAX_XHTML_BYTES = 256 * 1024
+    
+    def __init__(self, max_xhtml_bytes=None):
         self.temp_dir = tempfile.mkdtemp()
+        self.max_xhtml_bytes = max_xhtml_bytes or self.MAX_XHTML_BYTES
         
     def extract_book_metadata(self, book_path):
         """書籍メタデータ抽出"""
@@ -83,6 +87,33 @@ class QuickKDPConverter:
         
         return html
     
+    def split_html(self, html_content):
+        """章HTMLを見出し・段落境界で上限サイズ以下のパートに分割"""
+        if len(html_content.encode('utf-8')) <= self.max_xhtml_bytes:
+            return [html_content]
+        
+        parts = []
+        current = []
+        current_bytes = 0
+        
+        for block in html_content.split('\n\n'):
+            size = len(block.encode('utf-8'))
+            is_heading = block.startswith('<h')
+            
+            # 上限超過時、または半分以上埋まった状態で見出しが来たら改パート
+            if current and (current_bytes + size > self.max_xhtml_bytes
+                            or (is_heading and current_bytes >= self.max_xhtml_bytes // 2)):
+                parts.append('\n\n'.join(current))
+                current, current_bytes = [], 0
+            
+            current.append(block)
+            current_bytes += size
+        
+        if current:
+            parts.append('\n\n'.join(current))
+        
+        return parts
+    
     def create_simple_epub(self, book_path, output_path):
         """簡易EPUB作成"""
         metadata = self.extract_book_metadata(book_path)
@@ -127,7 +158,12 @@ class QuickKDPConverter:
             
             html_content = self.markdown_to_html(content)
             
-            chapter_html = f'''<?xml version="1.0" encoding="UTF-8"?>
+            # 大きな章は複数のXHTMLに分割（目次は先頭パートを指す）
+            parts = []
+            for j, html_part in enumerate(self.split_html(html_content)):
+                part_id = f'chapter{i+1:02d}' if j == 0 else f'chapter{i+1:02d}_{j+1:02d}'
+                
+                chapter_html = f'''<?xml version="1.0" encoding="UTF-8"?>
 <!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.1//EN" "http://www.w3.org/TR/xhtml11/DTD/xhtml11.dtd">
 <html xmlns="http://www.w3.org/1999/xhtml">
 <head>
@@ -135,18 +171,21 @@ class QuickKDPConverter:
     <meta http-equiv="Content-Type" content="text/html; charset=utf-8"/>
 </head>
 <body>
-    {html_content}
+    {html_part}
 </body>
 </html>'''
-            
-            chapter_filename = f'chapter{i+1:02d}.xhtml'
-            with open(os.path.join(epub_dir, 'OEBPS', chapter_filename), 'w', encoding='utf-8') as f:
-                f.write(chapter_html)
+                
+                part_filename = f'{part_id}.xhtml'
+                with open(os.path.join(epub_dir, 'OEBPS', part_filename), 'w', encoding='utf-8') as f:
+                    f.write(chapter_html)
+                
+                parts.append({'id': part_id, 'filename': part_filename})
             
             chapters.append({
-                'id': f'chapter{i+1:02d}',
-                'filename': chapter_filename,
-                'title': f'Chapter {i+1}'
+                'id': parts[0]['id'],
+                'filename': parts[0]['filename'],
+                'title': f'Chapter {i+1}',
+                'parts': parts
             })
         
         # content.opf
@@ -161,11 +200,11 @@ class QuickKDPConverter:
         <meta name="cover" content="cover"/>
     </metadata>
     <manifest>
-        {''.join([f'<item id="{ch["id"]}" href="{ch["filename"]}" media-type="application/xhtml+xml"/>' for ch in chapters])}
+        {''.join([f'<item id="{part["id"]}" href="{part["filename"]}" media-type="application/xhtml+xml"/>' for ch in chapters for part in ch["parts"]])}
         <item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>
     </manifest>
     <spine toc="ncx">
-        {''.join([f'<itemref idref="{ch["id"]}"/>' for ch in chapters])}
+        {''.join([f'<itemref idref="{part["id"]}"/>' for ch in chapters for part in ch["parts"]])}
     </spine>
 </package>'''
         
@@ -0,0 +1,70 @@
+const test = require('tape');
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const { spawnSync } = require('child_process');
+const KDPConverterWorker = require('../kdp-converter-worker.cjs');
+
+// 変換スクリプトの依存ライブラリが無い環境ではスキップ
+const pythonReady = spawnSync('python3', [
+  '-c', 'import numpy, markdown, bs4, ebooklib, PIL, requests'
+]).status === 0;
+
+// EPUBのみ・類似検出なしの設定で一時ディレクトリに出力する
+function createWorker() {
+  const tmpDir = fs.mkdtempSync(path.join(os.tmpdir(), 'kdp-worker-test-'));
+  const configPath = path.join(tmpDir, 'config.json');
+  fs.writeFileSync(configPath, JSON.stringify({
+    output_formats: ['epub'],
+    similarity_settings: { enabled: false }
+  }));
+
+  const outputDir = path.join(tmpDir, 'output');
+  const worker = new KDPConverterWorker({
+    script: path.join(__dirname, '..', 'markdown-to-kdp-converter.py'),
+    args: ['--config', configPath, '--output', outputDir],
+    timeoutMs: 60 * 1000
+  });
+
+  return { worker, tmpDir, outputDir };
+}
+
+test('KDPConverterWorker: pingに応答する', { skip: !pythonReady }, async (t) => {
+  const { worker, tmpDir } = createWorker();
+
+  try {
+    const response = await worker.send({ command: 'ping' });
+    t.equal(response.success, true, 'pingが成功すること');
+  } finally {
+    await worker.stop();
+    fs.rmSync(tmpDir, { recursive: true, force: true });
+  }
+
+  t.equal(worker.process, null, 'stop後にワーカープロセスが終了していること');
+  t.end();
+});
+
+test('KDPConverterWorker: メモリ上の章をEPUBに変換する', { skip: !pythonReady }, async (t) => {
+  const { worker, tmpDir, outputDir } = createWorker();
+
+  try {
+    const index = '---\ntitle: テスト書籍\nauthor: テスト著者\n---\n\n# テスト書籍\n';
+    const chapters = [
+      { filename: 'chapter-1.md', markdown: '# 第1章\n\nこれはテスト用の本文です。' },
+      { filename: 'chapter-2.md', markdown: '# 第2章\n\n1. 項目A\n2. 項目B' }
+    ];
+
+    const result = await worker.convertBook('test-book', chapters, { index });
+
+    t.equal(result.success, true, '変換が成功すること');
+    t.equal(result.output_dir, path.join(outputDir, 'test-book'), '書籍名のディレクトリに出力されること');
+
+    const epubFiles = fs.readdirSync(result.output_dir).filter(file => file.endsWith('.epub'));
+    t.equal(epubFiles.length, 1, 'EPUBファイルが生成されること');
+  } finally {
+    await worker.stop();
+    fs.rmSync(tmpDir, { recursive: true, force: true });
+  }
+
+  t.end();
+});